@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import itertools
 import logging
 import re
-from typing import List, cast
+from typing import Callable, Iterable, List, Set, Tuple
 
 import pcbnew
 
@@ -10,8 +11,34 @@ from .board_modifier import KICAD_VERSION
 
 logger = logging.getLogger(__name__)
 
+# polygon with fewer vertices has no area
+MIN_POLYGON_VERTICES = 3
 
-def convex_hull(points):
+
+def _half_hull(points: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Builds one chain of Andrew's monotone chain algorithm.
+
+    The 2D cross product of OA and OB vectors, i.e. z-component of their 3D
+    cross product, is inlined because this loop runs for every point.
+    It is positive if OAB makes a counter-clockwise turn, negative for
+    clockwise turn, and zero if the points are collinear.
+    """
+    chain: List[Tuple[int, int]] = []
+    pop = chain.pop
+    push = chain.append
+    for p in points:
+        px, py = p
+        while len(chain) >= 2:
+            ox, oy = chain[-2]
+            ax, ay = chain[-1]
+            if (ax - ox) * (py - oy) - (ay - oy) * (px - ox) > 0:
+                break
+            pop()
+        push(p)
+    return chain
+
+
+def convex_hull(points: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
     """Computes the convex hull of a set of 2D points.
 
     Input: an iterable sequence of (x, y) pairs representing the points.
@@ -24,31 +51,29 @@ def convex_hull(points):
 
     # Sort the points lexicographically (tuples are compared lexicographically).
     # Remove duplicates to detect the case we have just one unique point.
-    points = sorted(set(points))
+    # Callers may pass already de-duplicated set to avoid a redundant copy.
+    if not isinstance(points, (set, frozenset)):
+        points = set(points)
+    return convex_hull_of_sorted(sorted(points))
+
+
+def convex_hull_of_sorted(points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Computes the convex hull of a set of 2D points which are already sorted
+    lexicographically and do not contain duplicates.
 
-    # Boring case: no points or a single point, possibly repeated multiple times.
+    Allows skipping sorting step of `convex_hull` when points come from
+    a source known to produce ordered values.
+    """
+
+    # Boring case: no points or a single point.
     if len(points) <= 1:
         return points
 
-    # 2D cross product of OA and OB vectors, i.e. z-component of their 3D cross product.
-    # Returns a positive value, if OAB makes a counter-clockwise turn,
-    # negative for clockwise turn, and zero if the points are collinear.
-    def cross(o, a, b):
-        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
-
     # Build lower hull
-    lower = []
-    for p in points:
-        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
-            lower.pop()
-        lower.append(p)
+    lower = _half_hull(points)
 
     # Build upper hull
-    upper = []
-    for p in reversed(points):
-        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
-            upper.pop()
-        upper.append(p)
+    upper = _half_hull(reversed(points))
 
     # Concatenation of the lower and upper hulls gives the convex hull.
     # Last point of each list is omitted because it is repeated
@@ -56,6 +81,31 @@ def convex_hull(points):
     return lower[:-1] + upper[:-1]
 
 
+def _collect_outline_points(poly: pcbnew.SHAPE_POLY_SET) -> List[Tuple[int, int]]:
+    """Returns coordinates of all outlines vertices of polygon set as single
+    list of (x, y) tuples.
+    """
+    return [
+        (p.x, p.y)
+        for i in range(0, poly.OutlineCount())
+        for p in poly.Outline(i).CPoints()
+    ]
+
+
+def _collect_footprints_hull_points(
+    footprints: List[pcbnew.FOOTPRINT],
+) -> Set[Tuple[int, int]]:
+    """Returns de-duplicated vertices of bounding hulls of all footprints.
+
+    Bounding hulls are already convex so they contribute only few vertices
+    each.
+    """
+    points: Set[Tuple[int, int]] = set()
+    for f in footprints:
+        points.update(_collect_outline_points(f.GetBoundingHull()))
+    return points
+
+
 def build_board_outline_around_footprints(
     board: pcbnew.BOARD, outline_delta: float, footprints: List[pcbnew.FOOTPRINT]
 ) -> None:
@@ -63,16 +113,17 @@ def build_board_outline_around_footprints(
         msg = "Footprints for generating board edge not set"
         raise Exception(msg)
 
-    hulls = [f.GetBoundingHull() for f in footprints]
-    points = []
-    for hull in hulls:
-        for i in range(0, hull.OutlineCount()):
-            for p in hull.Outline(i).CPoints():
-                points.append((p.x, p.y))
-    result = convex_hull(points)
+    hull_points = _collect_footprints_hull_points(footprints)
+    result = convex_hull(hull_points)
+    if len(result) < MIN_POLYGON_VERTICES:
+        # all points collinear or equal, there is no area to surround
+        msg = "Degenerate footprints hull, can't generate board edge"
+        raise ValueError(msg)
+
     shape_line = pcbnew.SHAPE_LINE_CHAIN()
-    for r in result:
-        shape_line.Append(r[0], r[1])
+    append = shape_line.Append
+    for x, y in result:
+        append(x, y)
 
     outline = pcbnew.SHAPE_POLY_SET()
     outline.AddOutline(shape_line)
@@ -89,30 +140,51 @@ def build_board_outline_around_footprints(
         else:
             outline.Deflate(delta_mm, pcbnew.CORNER_STRATEGY_CHAMFER_ALL_CORNERS, 0)
 
-    delta_mm = cast(int, pcbnew.FromMM(abs(outline_delta)))
+    delta_mm = int(pcbnew.FromMM(abs(outline_delta)))
+    # zero delta uses hull as it is, without calling costly polygon offsetting
     if outline_delta > 0:
         _inflate_outline(outline, delta_mm)
     elif outline_delta < 0:
         _deflate_outline(outline, delta_mm)
 
-    points = []
-    for i in range(0, outline.OutlineCount()):
-        for p in outline.Outline(i).CPoints():
-            points.append((p.x, p.y))
+    points = _collect_outline_points(outline)
     # add first point to the end, easier zip iterate for closed shape:
     points.append(points[0])
-    for start, end in zip(points, points[1:]):
-        segment = pcbnew.PCB_SHAPE(board)
-        segment.SetShape(pcbnew.SHAPE_T_SEGMENT)
-        segment.SetLayer(pcbnew.Edge_Cuts)
-        if KICAD_VERSION >= (7, 0, 0):
-            segment.SetStart(pcbnew.VECTOR2I(start[0], start[1]))
-            segment.SetEnd(pcbnew.VECTOR2I(end[0], end[1]))
-        else:
-            segment.SetStart(pcbnew.wxPoint(start[0], start[1]))
-            segment.SetEnd(pcbnew.wxPoint(end[0], end[1]))
-        segment.SetWidth(pcbnew.FromMM(0.4))
-        board.Add(segment)
+    point = pcbnew.VECTOR2I if KICAD_VERSION >= (7, 0, 0) else pcbnew.wxPoint
+    width = int(pcbnew.FromMM(0.4))
+    layer = pcbnew.Edge_Cuts
+    shape = pcbnew.SHAPE_T_SEGMENT
+    new_shape = pcbnew.PCB_SHAPE
+    add = board.Add
+    for start, end in zip(points, itertools.islice(points, 1, None)):
+        segment = new_shape(board)
+        segment.SetShape(shape)
+        segment.SetLayer(layer)
+        segment.SetStart(point(start[0], start[1]))
+        segment.SetEnd(point(end[0], end[1]))
+        segment.SetWidth(width)
+        add(segment)
+
+
+def _get_annotation_matcher(footprint_annotation_format: str) -> Callable:
+    """Returns function testing if reference matches annotation format.
+
+    Typical formats (like 'SW{}') are a plain prefix followed by a number,
+    these are checked with string methods which are much faster than regex.
+    """
+    if re.fullmatch(r"\w*\{\}", footprint_annotation_format, flags=re.ASCII):
+        prefix = footprint_annotation_format[:-2]
+        start = len(prefix)
+
+        # equivalent of re.match(prefix + r"\d+", reference)
+        def _match(reference: str) -> bool:
+            return (
+                reference.startswith(prefix)
+                and reference[start : start + 1].isdecimal()
+            )
+
+        return _match
+    return re.compile(footprint_annotation_format.format(r"\d+")).match
 
 
 def build_board_outline(
@@ -137,9 +209,7 @@ def build_board_outline(
             f"matching '{footprint_annotation_format}' format"
         )
         footprints = board.GetFootprints()
-        pattern = re.compile(footprint_annotation_format.format("(\\d)+"))
-        selected_footprints = [
-            f for f in footprints if re.match(pattern, f.GetReference())
-        ]
+        match = _get_annotation_matcher(footprint_annotation_format)
+        selected_footprints = [f for f in footprints if match(f.GetReference())]
 
     build_board_outline_around_footprints(board, outline_delta, selected_footprints)
@@ -8,7 +8,7 @@ import string
 import sys
 from dataclasses import asdict, dataclass, field
 from enum import Flag
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional, TextIO, Tuple
 
 import wx
 from wx.lib.embeddedimage import PyEmbeddedImage
@@ -133,6 +133,20 @@ def get_file_picker(*args, **kwargs) -> wx.FilePickerCtrl:
 
 
 class FloatValidator(wx.Validator):
+    # navigation and editing keys which are always accepted
+    SKIP_KEYCODES = frozenset(
+        {
+            wx.WXK_BACK,
+            wx.WXK_DELETE,
+            wx.WXK_LEFT,
+            wx.WXK_RIGHT,
+            wx.WXK_NUMPAD_LEFT,
+            wx.WXK_NUMPAD_RIGHT,
+            wx.WXK_TAB,
+        }
+    )
+    DIGITS = frozenset(string.digits)
+
     def __init__(self) -> None:
         wx.Validator.__init__(self)
         self.Bind(wx.EVT_CHAR, self.OnChar)
@@ -164,32 +178,26 @@ class FloatValidator(wx.Validator):
         return True
 
     def OnChar(self, event: wx.KeyEvent) -> None:
-        text_ctrl = self.GetWindow()
-        current_position = text_ctrl.GetInsertionPoint()
         keycode = int(event.GetKeyCode())
-        if keycode in [
-            wx.WXK_BACK,
-            wx.WXK_DELETE,
-            wx.WXK_LEFT,
-            wx.WXK_RIGHT,
-            wx.WXK_NUMPAD_LEFT,
-            wx.WXK_NUMPAD_RIGHT,
-            wx.WXK_TAB,
-        ]:
+        if keycode in self.SKIP_KEYCODES:
+            event.Skip()
+            return
+
+        key = chr(keycode)
+        if key in self.DIGITS:
+            # allow only digits
+            event.Skip()
+            return
+
+        text_ctrl = self.GetWindow()
+        text = text_ctrl.GetValue()
+        if (
+            # or single '-' when as first character
+            # or single '.'
+            (key == "-" and "-" not in text and text_ctrl.GetInsertionPoint() == 0)
+            or (key == "." and "." not in text)
+        ):
             event.Skip()
-        else:
-            text_ctrl = self.GetWindow()
-            text = text_ctrl.GetValue()
-            key = chr(keycode)
-            if (
-                # allow only digits
-                # or single '-' when as first character
-                # or single '.'
-                key in string.digits
-                or (key == "-" and "-" not in text and current_position == 0)
-                or (key == "." and "." not in text)
-            ):
-                event.Skip()
 
 
 class LabeledTextCtrl(wx.Panel):
@@ -203,8 +211,12 @@ class LabeledTextCtrl(wx.Panel):
     ) -> None:
         super().__init__(parent)
 
-        expected_char_width = self.GetTextExtent("x").x
         if width != -1:
+            # measuring text is relatively slow, prefer value cached by dialog
+            expected_char_width = (
+                getattr(self.GetTopLevelParent(), "char_width", None)
+                or self.GetTextExtent("x").x
+            )
             annotation_format_size = wx.Size(
                 expected_char_width * width + TEXT_CTRL_EXTRA_SPACE, -1
             )
@@ -424,6 +436,10 @@ class ElementTemplateSelectionWidget(wx.Panel):
     def GetValue(self) -> str:
         return self.__layout_picker.GetPath()
 
+    def SetValue(self, path: str) -> None:
+        self.__layout_picker.SetPath(path)
+        self.__layout_picker.GetTextCtrl().SetInsertionPointEnd()
+
 
 class ElementPositionChoiceWidget(wx.Panel):
     def __init__(
@@ -497,10 +513,27 @@ class ElementPositionChoiceWidget(wx.Panel):
             self.position.Show()
             self.load_template.Hide()
             self.save_template.Hide()
-        self.GetTopLevelParent().Layout()
+        top_level = self.GetTopLevelParent()
+        # let dialog coalesce layout updates when many elements change at once
+        if schedule_layout := getattr(top_level, "schedule_layout", None):
+            schedule_layout()
+        else:
+            top_level.Layout()
         self.position.set_position_by_choice(choice)
         self.choice = PositionOption(choice)
 
+    def SetValue(
+        self,
+        choice: PositionOption,
+        position: Optional[ElementPosition],
+        template_path: str,
+    ) -> None:
+        self.__set_initial_state(choice)
+        if position and choice == PositionOption.CUSTOM:
+            self.position.set_position(position)
+        self.load_template.SetValue(template_path)
+        self.save_template.SetValue(template_path)
+
     def GetValue(self) -> Tuple[PositionOption, Optional[ElementPosition], str]:
         template_path = ""
         if self.dropdown.GetValue() == PositionOption.RELATIVE:
@@ -563,6 +596,14 @@ class ElementSettingsWidget(wx.Panel):
         position = self.position_widget.GetValue()
         return ElementInfo(annotation, *position)
 
+    def SetValue(self, element_info: ElementInfo) -> None:
+        self.annotation_format.text.SetValue(element_info.annotation_format)
+        self.position_widget.SetValue(
+            element_info.position_option,
+            element_info.position,
+            element_info.template_path,
+        )
+
     def Enable(self) -> None:
         self.position_widget.Enable()
 
@@ -583,6 +624,9 @@ class KbplacerDialog(wx.Dialog):
         language = get_current_kicad_language()
         logger.info(f"Language: {language}")
         self._ = get_plugin_translator(language)
+        # measure once, used by all text controls for calculating its size
+        self.char_width = self.GetTextExtent("x").x
+        self.__layout_pending = False
 
         switch_section = self.get_switch_section(
             layout_path=initial_state.layout_path,
@@ -767,11 +811,24 @@ class KbplacerDialog(wx.Dialog):
 
         buttons_sizer = wx.BoxSizer(wx.HORIZONTAL)
 
+        # removed elements are hidden and kept for reuse because creating
+        # new element widget (with all of its child controls) is slow
+        hidden_elements: List[ElementSettingsWidget] = []
+
         def add_element(element_info: ElementInfo) -> None:
-            element_settings = ElementSettingsWidget(scrolled_window, element_info)
+            if hidden_elements:
+                # elements are always removed from the end, so the most recently
+                # hidden one is next in sizer order after all visible elements
+                element_settings = hidden_elements.pop()
+                element_settings.SetValue(element_info)
+                element_settings.Show()
+            else:
+                element_settings = ElementSettingsWidget(scrolled_window, element_info)
+                scrolled_window_sizer.Add(
+                    element_settings, 0, wx.EXPAND | wx.ALIGN_LEFT, 0
+                )
             self.__additional_elements.append(element_settings)
-            scrolled_window_sizer.Add(element_settings, 0, wx.EXPAND | wx.ALIGN_LEFT, 0)
-            self.GetTopLevelParent().Layout()
+            self.schedule_layout()
 
         def add_element_callback(_) -> None:
             add_element(ElementInfo("", PositionOption.CUSTOM, ZERO_POSITION, ""))
@@ -792,8 +849,9 @@ class KbplacerDialog(wx.Dialog):
                 self.__additional_elements.pop() if self.__additional_elements else None
             )
             if element_settings:
-                element_settings.Destroy()
-                self.Layout()
+                element_settings.Hide()
+                hidden_elements.append(element_settings)
+                self.schedule_layout()
 
         remove_icon = PyEmbeddedImage(
             b"iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAYAAAAf8/9hAAAABHNCSVQICAgIfAhkiAAAABtJ"
@@ -809,6 +867,21 @@ class KbplacerDialog(wx.Dialog):
 
         return sizer
 
+    def schedule_layout(self) -> None:
+        """Request dialog layout update. Multiple requests made in quick
+        succession (for example when adding or removing many elements)
+        result in single layout recalculation.
+        """
+        if not self.__layout_pending:
+            self.__layout_pending = True
+            wx.CallAfter(self.__flush_layout)
+
+    def __flush_layout(self) -> None:
+        self.__layout_pending = False
+        # dialog might be already destroyed when this gets called
+        if self:
+            self.Layout()
+
     def get_misc_section(
         self,
         route_rows_and_columns: bool = True,
@@ -949,14 +1022,26 @@ class KbplacerDialog(wx.Dialog):
         )
 
 
-def load_window_state_from_log(filepath: str) -> WindowState:
+def _find_window_state(lines: Iterable[str]) -> Optional[WindowState]:
+    for line in lines:
+        if "GUI state:" in line:
+            return WindowState.from_dict(json.loads(line[line.find("{") :]))
+    return None
+
+
+def load_window_state_from_log(source: str | os.PathLike | TextIO) -> WindowState:
+    """Returns window state found in log file given by path or in already
+    opened text stream.
+    """
     try:
-        with open(filepath, "r") as f:
-            for line in f:
-                if "GUI state:" in line:
-                    state = WindowState.from_dict(json.loads(line[line.find("{") :]))
-                    logger.info("Using window state found in previous log")
-                    return state
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "r") as f:
+                state = _find_window_state(f)
+        else:
+            state = _find_window_state(source)
+        if state is not None:
+            logger.info("Using window state found in previous log")
+            return state
     except Exception:
         # if something went wrong use default
         pass
@@ -2,13 +2,14 @@ from __future__ import annotations
 
 import argparse
 import copy
+import functools
 import json
 import logging
 import pprint
 import re
 import sys
 from collections import defaultdict
-from dataclasses import asdict, dataclass, field, fields
+from dataclasses import dataclass, field, fields, is_dataclass
 from itertools import chain
 from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, Union
 
@@ -22,29 +23,29 @@ KEY_MAX_LABELS = 12
 # Map from serialized label position to normalized position,
 # depending on the alignment flags.
 # fmt: off
-LABEL_MAP: List[List[int]] = [
+LABEL_MAP: Tuple[Tuple[int, ...], ...] = (
     # 0  1  2  3  4  5  6  7  8  9 10 11   # align flags
-    [ 0, 6, 2, 8, 9,11, 3, 5, 1, 4, 7,10], # 0 = no centering
-    [ 1, 7,-1,-1, 9,11, 4,-1,-1,-1,-1,10], # 1 = center x
-    [ 3,-1, 5,-1, 9,11,-1,-1, 4,-1,-1,10], # 2 = center y
-    [ 4,-1,-1,-1, 9,11,-1,-1,-1,-1,-1,10], # 3 = center x & y
-    [ 0, 6, 2, 8,10,-1, 3, 5, 1, 4, 7,-1], # 4 = center front (default)
-    [ 1, 7,-1,-1,10,-1, 4,-1,-1,-1,-1,-1], # 5 = center front & x
-    [ 3,-1, 5,-1,10,-1,-1,-1, 4,-1,-1,-1], # 6 = center front & y
-    [ 4,-1,-1,-1,10,-1,-1,-1,-1,-1,-1,-1], # 7 = center front & x & y
-]
-
-REVERSE_LABEL_MAP: List[List[int]] = [
+    ( 0, 6, 2, 8, 9,11, 3, 5, 1, 4, 7,10), # 0 = no centering
+    ( 1, 7,-1,-1, 9,11, 4,-1,-1,-1,-1,10), # 1 = center x
+    ( 3,-1, 5,-1, 9,11,-1,-1, 4,-1,-1,10), # 2 = center y
+    ( 4,-1,-1,-1, 9,11,-1,-1,-1,-1,-1,10), # 3 = center x & y
+    ( 0, 6, 2, 8,10,-1, 3, 5, 1, 4, 7,-1), # 4 = center front (default)
+    ( 1, 7,-1,-1,10,-1, 4,-1,-1,-1,-1,-1), # 5 = center front & x
+    ( 3,-1, 5,-1,10,-1,-1,-1, 4,-1,-1,-1), # 6 = center front & y
+    ( 4,-1,-1,-1,10,-1,-1,-1,-1,-1,-1,-1), # 7 = center front & x & y
+)
+
+REVERSE_LABEL_MAP: Tuple[Tuple[int, ...], ...] = (
     # 0  1  2  3  4  5  6  7  8  9 10 11   # align flags
-    [ 0, 8, 2, 6, 9, 7, 1,10, 3, 4,11, 5], # 0 = no centering
-    [-1, 0,-1,-1, 6,-1,-1, 1,-1, 4,11, 5], # 1 = center x
-    [-1,-1,-1, 0, 8, 2,-1,-1,-1, 4,11, 5], # 2 = center y
-    [-1,-1,-1,-1, 0,-1,-1,-1,-1, 4,11, 5], # 3 = center x & y
-    [ 0, 8, 2, 6, 9, 7, 1,10, 3,-1, 4,-1], # 4 = center front (default)
-    [-1, 0,-1,-1, 6,-1,-1, 1,-1,-1, 4,-1], # 5 = center front & x
-    [-1,-1,-1, 0, 8, 2,-1,-1,-1,-1, 4,-1], # 6 = center front & y
-    [-1,-1,-1,-1, 0,-1,-1,-1,-1,-1, 4,-1], # 7 = center front & x & y
-]
+    ( 0, 8, 2, 6, 9, 7, 1,10, 3, 4,11, 5), # 0 = no centering
+    (-1, 0,-1,-1, 6,-1,-1, 1,-1, 4,11, 5), # 1 = center x
+    (-1,-1,-1, 0, 8, 2,-1,-1,-1, 4,11, 5), # 2 = center y
+    (-1,-1,-1,-1, 0,-1,-1,-1,-1, 4,11, 5), # 3 = center x & y
+    ( 0, 8, 2, 6, 9, 7, 1,10, 3,-1, 4,-1), # 4 = center front (default)
+    (-1, 0,-1,-1, 6,-1,-1, 1,-1,-1, 4,-1), # 5 = center front & x
+    (-1,-1,-1, 0, 8, 2,-1,-1,-1,-1, 4,-1), # 6 = center front & y
+    (-1,-1,-1,-1, 0,-1,-1,-1,-1,-1, 4,-1), # 7 = center front & x & y
+)
 # fmt: on
 
 
@@ -127,6 +128,25 @@ class KeyboardMetadata:
             self.background = Background(**self.background)
 
 
+# KLE raw data is compact, without spaces after separators
+_encode_kle = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _round(v: Any) -> Any:
+    return round(v, 6) if isinstance(v, float) else v
+
+
+def _add_prop(props: Dict[str, Any], name: str, value: Any, default: Any) -> Any:
+    """Adds KLE property to `props` if its value differs from default.
+    Returns rounded value.
+    """
+    value = _round(value)
+    default = _round(default)
+    if value != default:
+        props[name] = value
+    return value
+
+
 @dataclass
 class Keyboard:
     meta: KeyboardMetadata = field(default_factory=KeyboardMetadata)
@@ -142,21 +162,21 @@ class Keyboard:
         return cls(**data)
 
     def to_json(self: Keyboard, indent: Optional[int] = None) -> str:
-        return json.dumps(asdict(self), indent=indent)
+        return json.dumps(_to_dict(self), indent=indent)
 
     def __text_size_changed(self: Keyboard, current: list[Any], new: list[Any]) -> bool:
-        current = copy.copy(current)
-        new = copy.copy(new)
-        for obj in [current, new]:
-            if len_difference := KEY_MAX_LABELS - len(obj):
-                obj.extend(len_difference * [0])
-        return current != new
+        # same as comparing both lists padded with zeros to equal length
+        common = min(len(current), len(new))
+        if current[:common] != new[:common]:
+            return True
+        longer = current if len(current) > len(new) else new
+        return any(x != 0 for x in longer[common:])
 
     def to_kle(self: Keyboard) -> str:
         row = []
         rows = []
 
-        current: Key = copy.deepcopy(Key())
+        current: Key = Key()
         # some properties are not part of Key type, store them separately:
         current_alignment = 4
         current_f2 = -1
@@ -169,20 +189,12 @@ class Keyboard:
         for key in self.keys:
             props: dict[str, Any] = {}
 
-            def add_prop(name: str, value: Any, default: Any) -> Any:
-                def _round(v: Any) -> Any:
-                    return round(v, 6) if isinstance(v, float) else v
-
-                value = _round(value)
-                default = _round(default)
-                if value != default:
-                    props[name] = value
-                return value
-
-            if key.labels:
+            if any(key.labels):
                 alignment, labels = find_best_label_alignment(key.labels)
             else:
-                alignment, labels = 7, []
+                # labels with only empty items can't be aligned, for those
+                # `find_best_label_alignment` would fall back to 0
+                alignment, labels = 0 if key.labels else 7, []
 
             # detect new row
             new_cluster = (
@@ -211,48 +223,51 @@ class Keyboard:
 
                 new_row = False
 
-            current.rotation_angle = add_prop(
-                "r", key.rotation_angle, current.rotation_angle
+            current.rotation_angle = _add_prop(
+                props, "r", key.rotation_angle, current.rotation_angle
+            )
+            current.rotation_x = _add_prop(
+                props, "rx", key.rotation_x, current.rotation_x
+            )
+            current.rotation_y = _add_prop(
+                props, "ry", key.rotation_y, current.rotation_y
             )
-            current.rotation_x = add_prop("rx", key.rotation_x, current.rotation_x)
-            current.rotation_y = add_prop("ry", key.rotation_y, current.rotation_y)
 
-            x_offset = add_prop("x", round(key.x - current.x, 6), 0)
-            y_offset = add_prop("y", round(key.y - current.y, 6), 0)
+            x_offset = _add_prop(props, "x", round(key.x - current.x, 6), 0)
+            y_offset = _add_prop(props, "y", round(key.y - current.y, 6), 0)
             current.x = round(current.x + key.width + x_offset, 6)
             current.y = round(current.y + y_offset, 6)
 
-            current.color = add_prop("c", key.color, current.color)
+            current.color = _add_prop(props, "c", key.color, current.color)
             if text_color := reorder_items_kle(key.textColor, alignment):
                 if not text_color[0]:
                     text_color[0] = key.default.textColor
                 text_color = ["" if not item else item for item in text_color]
                 text_color = "\n".join(text_color).rstrip("\n")
-                current.textColor = add_prop("t", text_color, current.textColor)
+                current.textColor = _add_prop(props, "t", text_color, current.textColor)
             else:
-                current.default.textColor = add_prop(
-                    "t", key.default.textColor, current.default.textColor
+                current.default.textColor = _add_prop(
+                    props, "t", key.default.textColor, current.default.textColor
                 )
 
-            current.ghost = add_prop("g", key.ghost, current.ghost)
-            current.profile = add_prop("p", key.profile, current.profile)
-            current.sm = add_prop("sm", key.sm, current.sm)
-            current.sb = add_prop("sb", key.sb, current.sb)
-            current.st = add_prop("st", key.st, current.st)
+            current.ghost = _add_prop(props, "g", key.ghost, current.ghost)
+            current.profile = _add_prop(props, "p", key.profile, current.profile)
+            current.sm = _add_prop(props, "sm", key.sm, current.sm)
+            current.sb = _add_prop(props, "sb", key.sb, current.sb)
+            current.st = _add_prop(props, "st", key.st, current.st)
 
-            current_alignment = add_prop("a", alignment, current_alignment)
-            current.default.textSize = add_prop(
-                "f", key.default.textSize, current.default.textSize
+            current_alignment = _add_prop(props, "a", alignment, current_alignment)
+            current.default.textSize = _add_prop(
+                props, "f", key.default.textSize, current.default.textSize
             )
             if "f" in props:
                 current.textSize = []
 
-            text_size = reorder_items_kle(key.textSize, alignment)
-            text_size = [0 if not isinstance(i, int) else i for i in text_size]
+            text_size = reorder_text_sizes_kle(key.textSize, alignment)
             if self.__text_size_changed(current.textSize, text_size):
                 if not text_size:
-                    current.default.textSize = add_prop(
-                        "f", key.default.textSize, current.default.textSize
+                    current.default.textSize = _add_prop(
+                        props, "f", key.default.textSize, current.default.textSize
                     )
                     current.textSize = []
                 else:
@@ -260,21 +275,21 @@ class Keyboard:
                         optimize = all(x == text_size[1] for x in text_size[2:])
                     if optimize:
                         f2 = text_size[1]
-                        current_f2 = add_prop("f2", f2, current_f2)
+                        current_f2 = _add_prop(props, "f2", f2, current_f2)
                         # don't know why this gives type checking error, works fine:
                         current.textSize = [0] + (11 * [f2])  # type: ignore
                     else:
-                        current.textSize = add_prop("fa", text_size, [])
-
-            add_prop("w", key.width, 1)
-            add_prop("h", key.height, 1)
-            add_prop("w2", key.width2, key.width)
-            add_prop("h2", key.height2, key.height)
-            add_prop("x2", key.x2, 0)
-            add_prop("y2", key.y2, 0)
-            add_prop("l", key.stepped, False)
-            add_prop("n", key.nub, False)
-            add_prop("d", key.decal, False)
+                        current.textSize = _add_prop(props, "fa", text_size, [])
+
+            _add_prop(props, "w", key.width, 1)
+            _add_prop(props, "h", key.height, 1)
+            _add_prop(props, "w2", key.width2, key.width)
+            _add_prop(props, "h2", key.height2, key.height)
+            _add_prop(props, "x2", key.x2, 0)
+            _add_prop(props, "y2", key.y2, 0)
+            _add_prop(props, "l", key.stepped, False)
+            _add_prop(props, "n", key.nub, False)
+            _add_prop(props, "d", key.decal, False)
 
             if props:
                 row.append(props)
@@ -286,21 +301,46 @@ class Keyboard:
         if row:
             rows.append(row)
 
-        result = ""
+        parts = []
 
-        default_meta = asdict(KeyboardMetadata())
-        meta = copy.deepcopy(asdict(self.meta))
+        default_meta = _DEFAULT_META_DICT
+        meta = _to_dict(self.meta)
         if meta != default_meta:
             # include only non-default meta fields
-            for k in list(meta.keys()):
-                if default_meta.get(k, None) == meta[k]:
-                    del meta[k]
-            result += json.dumps(meta, indent=None) + ",\n"
-
-        for row in rows:
-            result += json.dumps(row, indent=None) + ",\n"
-        result = result.strip(",\n")
-        return result
+            meta = {k: v for k, v in meta.items() if default_meta.get(k) != v}
+            parts.append(_encode_kle(meta))
+
+        parts.extend(_encode_kle(row) for row in rows)
+        return ",\n".join(parts)
+
+
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+
+def _to_dict(obj: Any) -> Any:
+    """Converts dataclass instance to dict recursively.
+
+    Lightweight equivalent of `dataclasses.asdict`, which spends most of its
+    time deep copying every value. Here values are not copied, result is
+    meant only for serialization. Dataclass field names are cached per type.
+    """
+    names = _FIELD_NAMES.get(type(obj))
+    if names is None:
+        if isinstance(obj, list):
+            return [_to_dict(v) for v in obj]
+        if not is_dataclass(obj):
+            return obj
+        names = tuple(f.name for f in fields(obj))
+        _FIELD_NAMES[type(obj)] = names
+    return {name: _to_dict(getattr(obj, name)) for name in names}
+
+
+# constant values used when (de)serializing keyboard metadata,
+# must not be modified
+_DEFAULT_META_DICT = _to_dict(KeyboardMetadata())
+_KEYBOARD_METADATA_FIELDS = frozenset(
+    f.name for f in fields(KeyboardMetadata) if f.init
+)
 
 
 @dataclass
@@ -463,21 +503,22 @@ class MatrixAnnotatedKeyboard(Keyboard):
 
 
 def reorder_items(items: List[Any], align: int) -> List[Any]:
+    row = LABEL_MAP[align]
     ret: List[Any] = KEY_MAX_LABELS * [None]
     for i, item in enumerate(items):
         if item:
-            index = LABEL_MAP[align][i]
-            ret[index] = item
+            ret[row[i]] = item
     while ret and ret[-1] is None:
         ret.pop()
     return ret
 
 
 def reorder_items_kle(items, align) -> List[Any]:
+    row = REVERSE_LABEL_MAP[align]
     ret: List[Any] = KEY_MAX_LABELS * [None]
     for i, label in enumerate(items):
         if label:
-            index = REVERSE_LABEL_MAP[align][i]
+            index = row[i]
             if index == -1:
                 ret = []
                 break
@@ -487,31 +528,84 @@ def reorder_items_kle(items, align) -> List[Any]:
     return ret
 
 
-def find_best_label_alignment(labels) -> Tuple[int, List[Any]]:
+def reorder_text_sizes_kle(items, align) -> List[int]:
+    """Variant of `reorder_items_kle` for text sizes, uses 0 instead of None
+    for unset (and non-integer) sizes.
+    """
+    row = REVERSE_LABEL_MAP[align]
+    ret: List[int] = KEY_MAX_LABELS * [0]
+    length = 0
+    for i, size in enumerate(items):
+        if size:
+            index = row[i]
+            if index == -1:
+                return []
+            ret[index] = size if isinstance(size, int) else 0
+            if index >= length:
+                length = index + 1
+    del ret[length:]
+    return ret
+
+
+@functools.lru_cache(maxsize=None)
+def _find_best_alignment_for_mask(mask: int) -> Optional[int]:
+    """Returns best alignment for labels with non-empty items at positions
+    given by bits of `mask` or None if labels can't be aligned.
+    Result depends only on presence of labels, so there are at most
+    2^KEY_MAX_LABELS distinct inputs and each is calculated only once.
+    """
+    labels = ["x" if mask >> i & 1 else "" for i in range(mask.bit_length())]
     results = {}
     for align in reversed(range(0, 8)):
         if ret := reorder_items_kle(labels, align):
-            results[align] = ret
+            results[align] = len(ret)
+
+    if results:
+        return min(results.items(), key=lambda x: x[1])[0]
+    return None
+
+
+def find_best_label_alignment(labels) -> Tuple[int, List[Any]]:
+    mask = 0
+    for i, label in enumerate(labels):
+        if label:
+            mask |= 1 << i
 
-    if results.items():
-        best = min(results.items(), key=lambda x: len(x[1]))
-        return best[0], best[1]
-    else:
+    align = _find_best_alignment_for_mask(mask)
+    if align is None:
         return 0, []
+    return align, reorder_items_kle(labels, align)
+
+
+def _clone_key(key: Key) -> Key:
+    """Faster equivalent of `copy.deepcopy` for Key objects.
+    All fields are immutable except lists and default values, copy them
+    explicitly and share everything else.
+    """
+    clone = copy.copy(key)
+    clone.labels = key.labels.copy()
+    clone.textColor = key.textColor.copy()
+    clone.textSize = key.textSize.copy()
+    clone.default = KeyDefault(key.default.textColor, key.default.textSize)
+    return clone
+
+
+def _cleanup_attribute(
+    labels: List[Optional[str]], values: List[Any], default: Any
+) -> List[Any]:
+    ret = [
+        None if not label or value == default else value
+        for label, value in zip(labels, values)
+    ]
+    while ret and ret[-1] is None:
+        ret.pop()
+    return ret
 
 
 def cleanup_key(key: Key) -> None:
-    for attribute_name in ["textSize", "textColor"]:
-        attribute = getattr(key, attribute_name)
-        attribute = attribute[0 : len(key.labels)]
-        for i, (label, val) in enumerate(zip(key.labels, attribute)):
-            if not label:
-                attribute[i] = None
-            if val == getattr(key.default, attribute_name):
-                attribute[i] = None
-        while attribute and attribute[-1] is None:
-            attribute.pop()
-        setattr(key, attribute_name, attribute)
+    labels = key.labels
+    key.textSize = _cleanup_attribute(labels, key.textSize, key.default.textSize)
+    key.textColor = _cleanup_attribute(labels, key.textColor, key.default.textColor)
 
 
 def parse_qmk(layout) -> MatrixAnnotatedKeyboard:
@@ -603,6 +697,23 @@ def parse_via(layout) -> MatrixAnnotatedKeyboard:
     return MatrixAnnotatedKeyboard(meta=keyboard.meta, keys=keyboard.keys)
 
 
+def _parse_labels(labels: str, align: int) -> List[Any]:
+    """Splits KLE labels string and orders labels according to alignment."""
+    items = labels.split("\n")
+    if len(items) > KEY_MAX_LABELS:
+        msg = (
+            f"Illegal key labels: '{repr(labels)}'. "
+            f"Labels string can contain {KEY_MAX_LABELS} '\n' "
+            "separated items, ignoring redundant values."
+        )
+        logger.warning(msg)
+        del items[KEY_MAX_LABELS:]
+    return reorder_items(items, align)
+
+
+_KLE_ROTATION_PROPERTIES = frozenset(("r", "rx", "ry"))
+
+
 def parse_kle(layout) -> Keyboard:
     if not isinstance(layout, list):
         msg = "Expected an list of objects"
@@ -624,7 +735,7 @@ def parse_kle(layout) -> Keyboard:
         if isinstance(row, list):
             for k, item in enumerate(row):
                 if isinstance(item, str):
-                    new_key = copy.deepcopy(current)
+                    new_key = _clone_key(current)
                     # Calculate some generated values
                     new_key.width2 = (
                         current.width if new_key.width2 == 0 else current.width2
@@ -632,16 +743,7 @@ def parse_kle(layout) -> Keyboard:
                     new_key.height2 = (
                         current.height if new_key.height2 == 0 else current.height2
                     )
-                    items = item.split("\n")
-                    if len(items) > KEY_MAX_LABELS:
-                        msg = (
-                            f"Illegal key labels: '{repr(item)}'. "
-                            f"Labels string can contain {KEY_MAX_LABELS} '\n' "
-                            "separated items, ignoring redundant values."
-                        )
-                        logger.warning(msg)
-                        items = items[0:KEY_MAX_LABELS]
-                    new_key.labels = reorder_items(items, align)
+                    new_key.labels = _parse_labels(item, align)
                     new_key.textSize = reorder_items(new_key.textSize, align)
 
                     cleanup_key(new_key)
@@ -659,7 +761,7 @@ def parse_kle(layout) -> Keyboard:
                     current.stepped = False
                     current.decal = False
                 elif isinstance(item, dict):
-                    if k != 0 and ("r" in item or "rx" in item or "ry" in item):
+                    if k != 0 and not _KLE_ROTATION_PROPERTIES.isdisjoint(item):
                         msg = (
                             "Rotation can only be specified on the first key in the row"
                         )
@@ -737,8 +839,9 @@ def parse_kle(layout) -> Keyboard:
             current.y = round(current.y + 1, 6)
             current.x = current.rotation_x
         elif isinstance(row, dict) and r == 0:
-            field_set = {f.name for f in fields(KeyboardMetadata) if f.init}
-            row_filtered = {k: v for k, v in row.items() if k in field_set}
+            row_filtered = {
+                k: v for k, v in row.items() if k in _KEYBOARD_METADATA_FIELDS
+            }
             metadata = KeyboardMetadata(**row_filtered)
         else:
             msg = "Unexpected"
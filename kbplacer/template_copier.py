@@ -1,9 +1,9 @@
 import logging
+from typing import Dict
 
 import pcbnew
 
 from .board_modifier import (
-    get_footprint,
     get_orientation,
     get_position,
     get_side,
@@ -28,9 +28,18 @@ def copy_from_template_to_board(
     footprints = template.GetFootprints()
     board_nets_by_name = board.GetNetsByName()
 
+    # `get_footprint` scans all board footprints on each call, index them once.
+    # First occurrence wins, same as with `FindFootprintByReference`
+    board_footprints: Dict[str, pcbnew.FOOTPRINT] = {}
+    for f in board.GetFootprints():
+        board_footprints.setdefault(f.GetReference(), f)
+
     for footprint in footprints:
         reference = footprint.GetReference()
-        destination_footprint = get_footprint(board, reference)
+        destination_footprint = board_footprints.get(reference)
+        if destination_footprint is None:
+            msg = f"Cannot find footprint {reference}"
+            raise RuntimeError(msg)
 
         side = get_side(footprint)
         position = get_position(footprint)
@@ -42,18 +51,24 @@ def copy_from_template_to_board(
 
     if route_tracks:
         tracks = template.GetTracks()
+        add = board.Add
+        # net names and codes are read from pcbnew objects only for logging,
+        # skip that if message would be discarded anyway
+        log_tracks = logger.isEnabledFor(logging.INFO)
         for track in tracks:
             # Clone track but remap netinfo because net codes in template
             # might be different. Use net names for remapping
             # (names in template and board under modification must match)
             clone = track.Duplicate()
             net_name = clone.GetNetname()
-            net_code = clone.GetNetCode()
             net_info_in_board = board_nets_by_name[net_name]
-            logger.info(
-                f"Cloning track from template: {net_name}:{net_code}"
-                f"-> {net_info_in_board.GetNetname()}:"
-                f"{net_info_in_board.GetNetCode()}",
-            )
+            if log_tracks:
+                logger.info(
+                    "Cloning track from template: %s:%d-> %s:%d",
+                    net_name,
+                    clone.GetNetCode(),
+                    net_info_in_board.GetNetname(),
+                    net_info_in_board.GetNetCode(),
+                )
             clone.SetNet(net_info_in_board)
-            board.Add(clone)
+            add(clone)
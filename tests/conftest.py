@@ -95,6 +95,10 @@ def prepare_ci_machine() -> None:
 def prepare_kicad_config() -> None:
     test_dir = Path(__file__).parent
     config_path = pcbnew.SETTINGS_MANAGER.GetUserSettingsPath()
+    # do not create directories named after whatever replaced real `pcbnew`
+    # (for example mock object) when tests are collected without KiCad
+    if not isinstance(config_path, str) or not os.path.isabs(config_path):
+        return
     colors_path = f"{config_path}/colors"
     os.makedirs(colors_path, exist_ok=True)
     if not os.path.exists(f"{colors_path}/user.json"):
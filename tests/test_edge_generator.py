@@ -0,0 +1,115 @@
+import logging
+import re
+
+import pcbnew
+import pytest
+
+from kbplacer.board_modifier import set_position, set_rotation
+from kbplacer.edge_generator import (
+    MIN_POLYGON_VERTICES,
+    _collect_footprints_hull_points,
+    _collect_outline_points,
+    _get_annotation_matcher,
+    build_board_outline_around_footprints,
+    convex_hull,
+)
+
+from .conftest import add_switch_footprint, pointMM
+
+logger = logging.getLogger(__name__)
+
+
+def get_hull_points_without_cache(footprints):
+    points = set()
+    for f in footprints:
+        points.update(_collect_outline_points(f.GetBoundingHull()))
+    return points
+
+
+def test_hull_points_of_footprints_with_same_id(request) -> None:
+    board = pcbnew.CreateEmptyBoard()
+    footprints = [add_switch_footprint(board, request, i) for i in range(1, 5)]
+    for i, f in enumerate(footprints):
+        set_position(f, pointMM(19.05 * i, 0))
+    set_rotation(footprints[3], 90)
+
+    # footprints might be edited individually on the board and still have the
+    # same library ID, hull of one of them must not be reused for another
+    modified = footprints[1]
+    for item in list(modified.GraphicalItems()):
+        modified.Remove(item)
+    assert modified.GetFPID().GetUniStringLibId() == (
+        footprints[0].GetFPID().GetUniStringLibId()
+    )
+
+    # footprint with different shape but the same library ID, bounding box
+    # and number of pads and drawings, e.g. keycap outline of ISO enter
+    chamfered = add_switch_footprint(
+        board, request, 5, footprint="SW_Cherry_MX_PCB_1.00u_Chamfered"
+    )
+    chamfered.SetFPID(footprints[0].GetFPID())
+    set_position(chamfered, pointMM(19.05 * 4, 0))
+    reference = footprints[0]
+    assert chamfered.GetFPID().GetUniStringLibId() == (
+        reference.GetFPID().GetUniStringLibId()
+    )
+    assert len(chamfered.Pads()) == len(reference.Pads())
+    assert len(chamfered.GraphicalItems()) == len(reference.GraphicalItems())
+    assert chamfered.GetBoundingBox().GetWidth() == (
+        reference.GetBoundingBox().GetWidth()
+    )
+    assert chamfered.GetBoundingBox().GetHeight() == (
+        reference.GetBoundingBox().GetHeight()
+    )
+    footprints.append(chamfered)
+
+    points = _collect_footprints_hull_points(footprints)
+    assert points == get_hull_points_without_cache(footprints)
+
+
+@pytest.mark.parametrize(
+    "points,expected",
+    [
+        ([(0, 0), (1, 1), (2, 2), (3, 3)], [(0, 0), (3, 3)]),
+        ([(5, 0), (0, 0), (2, 0)], [(0, 0), (5, 0)]),
+        ([(1, 2), (1, 2)], [(1, 2)]),
+        ([], []),
+    ],
+)
+def test_convex_hull_of_degenerate_points(points, expected) -> None:
+    assert convex_hull(points) == expected
+
+
+@pytest.mark.parametrize(
+    "hull_points",
+    [
+        {(0, 0), (1000, 1000), (2000, 2000)},
+        {(0, 0), (0, 1000)},
+        {(500, 500)},
+    ],
+)
+def test_board_outline_of_degenerate_hull(request, monkeypatch, hull_points) -> None:
+    board = pcbnew.CreateEmptyBoard()
+    footprints = [add_switch_footprint(board, request, 1)]
+    monkeypatch.setattr(
+        "kbplacer.edge_generator._collect_footprints_hull_points",
+        lambda _: hull_points,
+    )
+    with pytest.raises(ValueError, match=r"Degenerate footprints hull"):
+        build_board_outline_around_footprints(board, 0, footprints)
+
+
+def test_convex_hull_of_triangle() -> None:
+    points = [(0, 0), (2, 0), (1, 1), (1, 3)]
+    assert len(convex_hull(points)) == MIN_POLYGON_VERTICES
+
+
+@pytest.mark.parametrize("fmt", ["SW{}", "{}", "SW{}A", "S.W{}"])
+@pytest.mark.parametrize(
+    "reference",
+    ["SW1", "SW12", "SW1A", "S1W1", "SW", "SW1x", "sw1", "SW\u0663", "1", "A1", ""],
+)
+def test_annotation_matcher(fmt, reference) -> None:
+    matcher = _get_annotation_matcher(fmt)
+    expected = re.match(fmt.format(r"\d+"), reference) is not None
+    assert bool(matcher(reference)) == expected
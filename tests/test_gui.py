@@ -1,5 +1,6 @@
-import copy
 import ctypes
+import functools
+import io
 import json
 import logging
 import os
@@ -7,11 +8,17 @@ import subprocess
 import sys
 import time
 from dataclasses import asdict
+from pathlib import Path
 
 import pytest
-from PIL import ImageGrab
+from PIL import Image, ImageGrab
 from pyvirtualdisplay.smartdisplay import DisplayTimeoutError, SmartDisplay
 
+try:
+    import mss
+except ImportError:
+    mss = None
+
 from kbplacer.element_position import ElementInfo, ElementPosition, PositionOption, Side
 from kbplacer.kbplacer_dialog import WindowState, load_window_state_from_log
 
@@ -20,6 +27,13 @@ if sys.platform == "win32":
 
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+# seconds to wait for GUI process to exit after requesting it
+PROCESS_EXIT_TIMEOUT = 10
+# seconds to wait for GUI window to appear before taking screenshot
+WINDOW_WAIT_TIMEOUT = 2
+
 STATE_RESTORED_LOG = "Using window state found in previous log"
 STATE_DEFAULT_LOG = "Failed to parse window state from log file, using default"
 
@@ -78,13 +92,22 @@ CUSTOM_WINDOW_STATE_EXAMPLE1 = WindowState(
 
 
 class LinuxVirtualScreenManager:
+    def __init__(self, display: SmartDisplay) -> None:
+        # display is owned by `virtual_display` fixture and shared between tests
+        self.display = display
+
     def __enter__(self):
-        self.display = SmartDisplay(backend="xvfb", size=(960, 640))
-        self.display.start()
+        # point GUI processes started by the test to the virtual display,
+        # only for duration of the test
+        self.previous_display = os.environ.get("DISPLAY")
+        os.environ["DISPLAY"] = self.display.new_display_var
         return self
 
     def __exit__(self, *exc):
-        self.display.stop()
+        if self.previous_display is None:
+            os.environ.pop("DISPLAY", None)
+        else:
+            os.environ["DISPLAY"] = self.previous_display
         return False
 
     def screenshot(self, window_name, path):
@@ -99,19 +122,48 @@ class LinuxVirtualScreenManager:
 
 class HostScreenManager:
     def __enter__(self):
+        # grabber allocates OS resources, create it once and reuse for
+        # all screenshots, fallback to PIL if `mss` not installed
+        self.sct = mss.mss() if mss else None
         return self
 
     def __exit__(self, *exc):
+        if self.sct:
+            self.sct.close()
         return False
 
+    def grab(self, bbox):
+        if self.sct is None:
+            img = ImageGrab.grab()
+            return img.crop(bbox) if bbox else img
+
+        if bbox:
+            left, top, right, bottom = bbox
+            monitor = {
+                "left": left,
+                "top": top,
+                "width": right - left,
+                "height": bottom - top,
+            }
+        else:
+            # all monitors combined
+            monitor = self.sct.monitors[0]
+        # grab only window area instead of cropping whole screen capture
+        sct_img = self.sct.grab(monitor)
+        return Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
+
     def screenshot(self, window_name, path):
         try:
-            time.sleep(1)
-            window_handle = find_window(window_name)
+            if sys.platform == "win32":
+                window_handle = wait_for_window(window_name)
+                # window exists, give it a moment to finish painting
+                time.sleep(0.2)
+            else:
+                # no way to find window, give it time to show up
+                time.sleep(1)
+                window_handle = None
             window_rect = get_window_position(window_handle)
-            img = ImageGrab.grab()
-            if window_rect:
-                img = img.crop(window_rect)
+            img = self.grab(window_rect)
             img.save(path)
             return True
         except Exception as err:
@@ -126,6 +178,22 @@ def find_window(name):
     return user32.FindWindowW(None, name)
 
 
+def wait_for_window(name, timeout=WINDOW_WAIT_TIMEOUT):
+    """Polls for window with non-empty area instead of sleeping fixed time.
+    Returns last found handle (which might be invalid) when timeout expires.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        window_handle = find_window(name)
+        if window_handle:
+            left, top, right, bottom = get_window_position(window_handle)
+            if right > left and bottom > top:
+                return window_handle
+        if time.monotonic() >= deadline:
+            return window_handle
+        time.sleep(0.02)
+
+
 def get_window_position(window_handle):
     if sys.platform != "win32":
         return None
@@ -144,17 +212,22 @@ def get_window_position(window_handle):
 
 def run_process(args, package_path):
     env = os.environ.copy()
+    # child must flush 'Press any key to exit' prompt promptly, otherwise
+    # `communicate` may hit timeout and process would be killed
+    env["PYTHONUNBUFFERED"] = "1"
     return subprocess.Popen(
         args,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         stdin=subprocess.PIPE,
         text=True,
+        bufsize=1,
         cwd=package_path,
         env=env,
     )
 
 
+@functools.lru_cache(maxsize=1)
 def is_xvfb_avaiable() -> bool:
     try:
         p = subprocess.Popen(
@@ -171,11 +244,26 @@ def is_xvfb_avaiable() -> bool:
     return False
 
 
+@pytest.fixture(scope="session")
+def virtual_display():
+    if sys.platform != "linux" or not is_xvfb_avaiable():
+        yield None
+        return
+    # starting Xvfb is slow, all GUI tests use the same display
+    # (each opens and closes own window)
+    # do not change DISPLAY for the whole session, it would affect all other
+    # tests, screen manager sets it when needed
+    display = SmartDisplay(backend="xvfb", size=(960, 640), manage_global_env=False)
+    display.start()
+    yield display
+    display.stop()
+
+
 @pytest.fixture
-def screen_manager():
+def screen_manager(virtual_display):
     if sys.platform == "linux":
-        if is_xvfb_avaiable():
-            return LinuxVirtualScreenManager()
+        if virtual_display is not None:
+            return LinuxVirtualScreenManager(virtual_display)
         else:
             return HostScreenManager()
     elif sys.platform == "win32":
@@ -191,13 +279,16 @@ def run_gui_test(tmpdir, screen_manager, window_name, gui_callback) -> None:
     # this is not related with plugin's code - try to get screenshot 3 times
     # to limit false positives
     max_attempts = 3
-    for i in range(0, max_attempts):
-        with screen_manager as mgr:
+    # enter screen manager once, reuse it for all attempts
+    with screen_manager as mgr:
+        for i in range(0, max_attempts):
             p = gui_callback()
 
             is_ok = mgr.screenshot(window_name, f"{tmpdir}/report/screenshot.png")
             try:
-                outs, errs = p.communicate("q\n", timeout=1)
+                # `communicate` returns as soon as process exits, timeout is
+                # only upper bound for closing dialog and saving coverage data
+                outs, errs = p.communicate("q\n", timeout=PROCESS_EXIT_TIMEOUT)
             except subprocess.TimeoutExpired:
                 logger.error("Process timeout expired")
                 p.kill()
@@ -224,6 +315,7 @@ def run_gui_test(tmpdir, screen_manager, window_name, gui_callback) -> None:
     assert is_ok
 
 
+@pytest.mark.gui
 def test_gui_default_state(tmpdir, package_path, package_name, screen_manager) -> None:
     def _callback():
         return run_process(
@@ -244,6 +336,7 @@ def test_gui_default_state(tmpdir, package_path, package_name, screen_manager) -
         assert state == DEFAULT_WINDOW_STATE
 
 
+@pytest.mark.gui
 def test_help_dialog(tmpdir, package_path, package_name, screen_manager) -> None:
     def _callback():
         return run_process(
@@ -254,25 +347,32 @@ def test_help_dialog(tmpdir, package_path, package_name, screen_manager) -> None
 
 
 def merge_dicts(dict1, dict2):
-    for key, val in dict2.items():
-        if key not in dict1:
-            dict1[key] = val
-            continue
-
-        if isinstance(val, dict):
-            merge_dicts(dict1[key], val)
-        else:
-            dict1[key] = val
+    stack = [(dict1, dict2)]
+    while stack:
+        destination, source = stack.pop()
+        for key, val in source.items():
+            current = destination.get(key, _MISSING)
+            if current is _MISSING or not isinstance(val, dict):
+                destination[key] = val
+            else:
+                stack.append((current, val))
     return dict1
 
 
 def get_state_data(state: dict, name: str):
-    input_state = copy.deepcopy(asdict(DEFAULT_WINDOW_STATE))
-    input_state = merge_dicts(input_state, state)
-    input_state = WindowState.from_dict(input_state)
-    return pytest.param(input_state, id=name)
+    return pytest.param(state, id=name)
 
 
+@pytest.fixture
+def state(request) -> WindowState:
+    # merge with default state only when test runs and not during collection,
+    # `asdict` already returns new containers, there is no need to copy them
+    input_state = asdict(DEFAULT_WINDOW_STATE)
+    input_state = merge_dicts(input_state, request.param)
+    return WindowState.from_dict(input_state)
+
+
+@pytest.mark.gui
 @pytest.mark.parametrize(
     "state",
     [
@@ -300,6 +400,7 @@ def get_state_data(state: dict, name: str):
         get_state_data(asdict(CUSTOM_WINDOW_STATE_EXAMPLE1), "custom-state-1"),
         # fmt: on
     ],
+    indirect=True,
 )
 def test_gui_state_restore(
     state, tmpdir, package_path, package_name, screen_manager
@@ -340,14 +441,34 @@ def log_file(tmpdir):
     "input_state",
     [DEFAULT_WINDOW_STATE, CUSTOM_WINDOW_STATE_EXAMPLE1],
 )
-def test_load_window_state_from_log(caplog, log_file, input_state: WindowState) -> None:
-    logfile_path = log_file(f"GUI state: {input_state}")
-    state = load_window_state_from_log(logfile_path)
+def test_load_window_state_from_log(caplog, input_state: WindowState) -> None:
+    state = load_window_state_from_log(io.StringIO(f"GUI state: {input_state}"))
     assert state == input_state
     assert len(caplog.records) == 1
     assert caplog.records[0].message == STATE_RESTORED_LOG
 
 
+def test_load_window_state_from_log_with_other_entries(caplog, log_file) -> None:
+    content = "\n".join(
+        10000 * ["[kbplacer_plugin_action.py:63]: Plugin version: 0.0.0"]
+        + [f"GUI state: {CUSTOM_WINDOW_STATE_EXAMPLE1}"]
+        + 10000 * ["[key_placer.py:100]: Setting SW1 footprint position"]
+    )
+    logfile_path = log_file(content)
+    state = load_window_state_from_log(logfile_path)
+    assert state == CUSTOM_WINDOW_STATE_EXAMPLE1
+    assert len(caplog.records) == 1
+    assert caplog.records[0].message == STATE_RESTORED_LOG
+
+
+def test_load_window_state_from_log_path(caplog, log_file) -> None:
+    logfile_path = Path(log_file(f"GUI state: {CUSTOM_WINDOW_STATE_EXAMPLE1}"))
+    state = load_window_state_from_log(logfile_path)
+    assert state == CUSTOM_WINDOW_STATE_EXAMPLE1
+    assert len(caplog.records) == 1
+    assert caplog.records[0].message == STATE_RESTORED_LOG
+
+
 @pytest.mark.parametrize(
     "input_state",
     [
@@ -356,11 +477,8 @@ def test_load_window_state_from_log(caplog, log_file, input_state: WindowState)
         'GUI state {"invalid": "dict"}',
     ],
 )
-def test_load_window_state_from_corrupted_log(
-    caplog, log_file, input_state: str
-) -> None:
-    logfile_path = log_file(input_state)
-    state = load_window_state_from_log(logfile_path)
+def test_load_window_state_from_corrupted_log(caplog, input_state: str) -> None:
+    state = load_window_state_from_log(io.StringIO(input_state))
     assert state == DEFAULT_WINDOW_STATE
     assert caplog.records[0].message == STATE_DEFAULT_LOG
 
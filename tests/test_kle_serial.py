@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import json
 import locale
 import logging
@@ -31,10 +32,9 @@ from .conftest import add_url_to_report
 logger = logging.getLogger(__name__)
 
 
-def __minify(string: str) -> str:
-    for ch in ["\n", " "]:
-        string = string.replace(ch, "")
-    return string
+def __minify(data: bytes) -> bytes:
+    # deleting with `bytes.translate` is single pass over data
+    return data.translate(None, b"\n ")
 
 
 def keyboard_to_url(tmpdir, keyboard: Keyboard) -> None:
@@ -165,6 +165,17 @@ def test_labels_colors() -> None:
     assert [json.loads(result.to_kle())] == layout
 
 
+def test_empty_labels_alignment() -> None:
+    keys = [
+        {"labels": [None, ""]},
+        {"labels": [], "x": 1},
+        {"labels": ["x"], "x": 2},
+    ]
+    keyboard = Keyboard.from_json({"meta": {}, "keys": keys})
+    expected = [[{"a": 0}, "", {"a": 7}, "", {"a": 4}, "x"]]
+    assert [json.loads(keyboard.to_kle())] == expected
+
+
 def test_float_accuracy() -> None:
     # few first keys from atreus preset
     atreus = (
@@ -243,11 +254,17 @@ def test_keyboard_from_invalid_schema() -> None:
         Keyboard.from_json({})  # type: ignore
 
 
-def get_reference(path: Path):
+@functools.lru_cache(maxsize=None)
+def _read_reference(path: Path) -> str:
     with open(path, "r") as f:
-        layout: str = f.read()
-        reference_dict = json.loads(layout)
-        return Keyboard.from_json(reference_dict)
+        return f.read()
+
+
+def get_reference(path: Path):
+    # cache only file content, `Keyboard.from_json` modifies its input
+    # and returned Keyboard is mutable so each caller needs own copy
+    reference_dict = json.loads(_read_reference(path))
+    return Keyboard.from_json(reference_dict)
 
 
 def __get_parameters():
@@ -289,15 +306,15 @@ def test_with_kle_references(layout_file, reference_file, request) -> None:
 
     reference = get_reference(Path(test_dir) / reference_file)
 
-    with open(Path(test_dir) / layout_file, "r") as f:
-        layout = json.load(f)
-        result = parse_kle(layout)
-        assert result == reference
+    raw_layout = (Path(test_dir) / layout_file).read_bytes()
+
+    layout = json.loads(raw_layout)
+    result = parse_kle(layout)
+    assert result == reference
 
-        f.seek(0)
-        kle_result = json.loads("[" + __minify(result.to_kle()) + "]")
-        expected = json.loads(__minify(f.read()))
-        assert kle_result == expected
+    kle_result = json.loads(b"[" + __minify(result.to_kle().encode()) + b"]")
+    expected = json.loads(__minify(raw_layout))
+    assert kle_result == expected
 
 
 @pytest.mark.parametrize("example", ["2x2", "1x2-with-2U-bottom", "1x1-rotated"])